@@ -24,18 +24,52 @@ Meta/WhatsApp Business.  You can write and deploy this bot while
 waiting for verification, but Twilio will not deliver messages
 until your WhatsApp number is authorised.  See Twilio's docs for
 details.
+
+In production the app is served by gunicorn with gevent workers (see
+render.yaml); ``python kabuto_ai/bot.py`` only registers the Telegram
+webhook, and ``python kabuto_ai/bot.py --dev`` additionally starts Flask's
+development server for local testing.
 """
 
 import os
-from collections import defaultdict, deque
-from datetime import datetime, timedelta, timezone
-from typing import Tuple
 
+# Under gevent the standard library has to be patched before anything else
+# (sockets, threads, locks) is imported.  gunicorn's gevent worker does this
+# itself; set GEVENT=1 when running the app under gevent by other means.
+# GEVENT is read before load_dotenv() runs (python-dotenv pulls in logging and
+# with it threading), so it must be a real process environment variable; a
+# GEVENT entry in .env is ignored.
+if os.getenv("GEVENT"):
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import base64
+import functools
+import gzip
+import hashlib
+import hmac
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cachetools
+import httpx
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, request, abort, jsonify, render_template
+from flask import (
+    Flask, Response, request, abort, jsonify, render_template, stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider
 import telebot
+import openai
 from openai import OpenAI
-from langdetect import detect
+from lingua import Language, LanguageDetectorBuilder
 
 # Twilio: only MessagingResponse is needed for responding to incoming
 # WhatsApp messages.  If you also want to send outbound messages via
@@ -63,6 +97,13 @@ load_dotenv()
 
 TELEGRAM_API_TOKEN = os.getenv("TELEGRAM_API_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional comma-separated list of keys; requests are spread across all of
+# them so a single key's rate limit does not stall every conversation.
+OPENAI_API_KEYS: List[str] = [
+    key.strip()
+    for key in (os.getenv("OPENAI_API_KEYS") or OPENAI_API_KEY or "").split(",")
+    if key.strip()
+]
 PORT = int(os.getenv("PORT", "8080"))
 PUBLIC_BASE_URL = os.getenv("TELEGRAM_WEBHOOK_URL_BASE") or os.getenv("RENDER_EXTERNAL_URL")
 
@@ -70,23 +111,136 @@ PUBLIC_BASE_URL = os.getenv("TELEGRAM_WEBHOOK_URL_BASE") or os.getenv("RENDER_EX
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")  # e.g. 'whatsapp:+14155238886'
+# HMAC key for verifying X-Twilio-Signature on incoming webhooks.
+_TWILIO_KEY = TWILIO_AUTH_TOKEN.encode("utf-8") if TWILIO_AUTH_TOKEN else None
 
-if not TELEGRAM_API_TOKEN or not OPENAI_API_KEY:
+if not TELEGRAM_API_TOKEN or not OPENAI_API_KEYS:
     raise RuntimeError(
-        "Bitte TELEGRAM_API_TOKEN und OPENAI_API_KEY in der .env / Render-Env setzen!"
+        "Bitte TELEGRAM_API_TOKEN und OPENAI_API_KEY (oder OPENAI_API_KEYS) "
+        "in der .env / Render-Env setzen!"
     )
 
 # ---------------------------------------------------------------------------
-# OpenAI client
+# OpenAI client pool
 #
-client = OpenAI(api_key=OPENAI_API_KEY)
+# One OpenAI client is created per API key, each with its own pooled HTTP/2
+# connection (httpx.Client is thread-safe, so every Flask and telebot worker
+# thread shares them).  Requests are handed out round-robin; a client that
+# hits a rate limit is skipped for RATE_LIMIT_COOLDOWN_SECONDS.
+# Connection-level failures are retried by the transport; rate limits and
+# server errors are retried with backoff in ``create_chat_completion`` below,
+# so the SDK's own retries are disabled.
+OPENAI_MAX_ATTEMPTS = 4
+RATE_LIMIT_COOLDOWN_SECONDS = 20
+
+
+def _make_openai_client(api_key: str) -> OpenAI:
+    http_client = httpx.Client(
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(
+                max_keepalive_connections=64, max_connections=128, keepalive_expiry=300
+            ),
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+OPENAI_CLIENTS: List[OpenAI] = [_make_openai_client(key) for key in OPENAI_API_KEYS]
+_client_cycle = itertools.cycle(range(len(OPENAI_CLIENTS)))
+_client_lock = threading.Lock()
+_client_cooldown_until = [0.0] * len(OPENAI_CLIENTS)
+client_rate_limit_counts = [0] * len(OPENAI_CLIENTS)
+
+
+def next_openai_client() -> Tuple[int, OpenAI]:
+    """Return the next client (and its index) that is not cooling down.
+
+    If every client is currently rate limited, the one whose cooldown ends
+    first is returned.
+    """
+    with _client_lock:
+        now = time.monotonic()
+        for _ in range(len(OPENAI_CLIENTS)):
+            idx = next(_client_cycle)
+            if _client_cooldown_until[idx] <= now:
+                return idx, OPENAI_CLIENTS[idx]
+        idx = min(range(len(OPENAI_CLIENTS)), key=_client_cooldown_until.__getitem__)
+        return idx, OPENAI_CLIENTS[idx]
+
+
+def _mark_rate_limited(idx: int) -> bool:
+    """Put a client on cooldown; return True if another client is still free."""
+    with _client_lock:
+        now = time.monotonic()
+        client_rate_limit_counts[idx] += 1
+        _client_cooldown_until[idx] = now + RATE_LIMIT_COOLDOWN_SECONDS
+        return any(until <= now for until in _client_cooldown_until)
+
+
+def create_chat_completion(**kwargs):
+    """Call the chat completions API, retrying on rate limits and 5xx errors.
+
+    A rate-limited client is put on cooldown and, if another client in the
+    pool is not cooling down, the request moves straight on to it.
+    Otherwise retries use exponential backoff with jitter (1s, 2s, 4s, ...
+    plus up to one second).  Any other error, or the last failed attempt,
+    is raised to the caller.
+    """
+    for attempt in range(OPENAI_MAX_ATTEMPTS):
+        idx, openai_client = next_openai_client()
+        try:
+            return openai_client.chat.completions.create(**kwargs)
+        except openai.APIStatusError as e:
+            rate_limited = isinstance(e, openai.RateLimitError)
+            if not (rate_limited or e.status_code >= 500) or attempt == OPENAI_MAX_ATTEMPTS - 1:
+                raise
+            if rate_limited and _mark_rate_limited(idx):
+                continue
+            time.sleep(2 ** attempt + random.random())
 
 
 # ---------------------------------------------------------------------------
 # Telegram bot and Flask app
 #
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, used by ``jsonify``."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 bot = telebot.TeleBot(TELEGRAM_API_TOKEN, parse_mode="HTML")
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Templates only change on deploy, so skip the per-request mtime check, and
+# accept paths with or without a trailing slash instead of redirecting.
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+app.url_map.strict_slashes = False
+# Web chat and WhatsApp payloads are tiny; larger bodies are rejected with 413
+# before they are read (see ``request_too_large``), and individual messages
+# are cut to MAX_MESSAGE_CHARS.  This is deliberately not the app-wide
+# MAX_CONTENT_LENGTH: Telegram updates quoting a long non-ASCII message can
+# legitimately exceed it, and a 413 makes Telegram redeliver them forever.
+MAX_CHAT_REQUEST_BYTES = 32 * 1024
+MAX_MESSAGE_CHARS = 4000
+
+
+def request_too_large() -> bool:
+    """Return True if the current body exceeds MAX_CHAT_REQUEST_BYTES.
+
+    Chunked bodies announce no length up front and are treated as too large.
+    """
+    length = request.content_length
+    if length is None:
+        return "chunked" in request.headers.get("Transfer-Encoding", "").lower()
+    return length > MAX_CHAT_REQUEST_BYTES
 
 
 # ---------------------------------------------------------------------------
@@ -95,15 +249,90 @@ app = Flask(__name__)
 # We maintain a separate history for each (client_id, channel_id) pair.  The
 # channel_id is the Telegram chat id, WhatsApp phone number, or any
 # arbitrary string you assign (e.g. session id for web).  Each history
-# stores up to MAX_TURNS messages and is reset after INACTIVITY_MINUTES.
+# stores up to MAX_TURNS messages as (role, content) tuples and is reset
+# after INACTIVITY_SECONDS.  Activity timestamps are time.monotonic() values.
+#
+# The store itself is bounded: at most MAX_SESSIONS sessions are kept (the
+# least recently used one is evicted first) and sessions idle for longer
+# than SESSION_TTL_SECONDS are dropped entirely, so every unique web IP or
+# phone number does not leave a permanent entry behind.
+#
+# Sessions are spread over STORE_SHARDS independent stores, each guarded by
+# its own lock, so Flask and telebot worker threads only contend when they
+# touch the same shard and the read-modify-write on a session is atomic.
 MAX_TURNS = 16
-INACTIVITY_MINUTES = 30
-conversation_store: defaultdict[Tuple[str, str], dict] = defaultdict(
-    lambda: {
-        "messages": deque(maxlen=MAX_TURNS),
-        "last_activity": datetime.now(timezone.utc),
-    }
-)
+INACTIVITY_SECONDS = 30 * 60
+MAX_SESSIONS = 10_000
+SESSION_TTL_SECONDS = 60 * 60
+SWEEP_EVERY = 256
+STORE_SHARDS = 16  # must be a power of two
+
+
+class LRUConversationStore:
+    """Size-capped mapping of (client_id, channel_id) to conversation state.
+
+    ``get`` only looks sessions up; ``get_or_create`` also creates a missing
+    one with an empty history.  Only ``get_or_create`` marks the session as
+    most recently used, and callers use it exactly when they record a
+    message and refresh ``last_activity``, so the order of the store always
+    matches the order of activity.  Every SWEEP_EVERY accesses, expired
+    sessions are removed from the least-recently-used end, stopping at the
+    first one that is still active.  The store is not thread-safe on its own; it is
+    always used through a shard lock (see ``_shard``).
+    """
+
+    def __init__(self, capacity: int = MAX_SESSIONS, ttl: float = SESSION_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._sessions: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._accesses = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._sessions
+
+    def get(self, key: Tuple[str, str]) -> Optional[dict]:
+        """Return the session for ``key``, or None without creating one.
+
+        Reads do not change the session's position in the LRU order.
+        """
+        self._accesses += 1
+        if self._accesses % SWEEP_EVERY == 0:
+            self.sweep()
+        return self._sessions.get(key)
+
+    def get_or_create(self, key: Tuple[str, str]) -> dict:
+        """Return the session for ``key``, creating an empty one if needed."""
+        st = self.get(key)
+        if st is not None:
+            self._sessions.move_to_end(key)
+            return st
+        st = {"messages": deque(maxlen=MAX_TURNS), "last_activity": time.monotonic()}
+        self._sessions[key] = st
+        if len(self._sessions) > self.capacity:
+            self._sessions.popitem(last=False)
+        return st
+
+    def sweep(self) -> None:
+        """Drop sessions that have been idle for longer than the TTL."""
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            key, st = next(iter(self._sessions.items()))
+            if st["last_activity"] > cutoff:
+                break
+            del self._sessions[key]
+
+
+_SHARDS: List[Tuple[LRUConversationStore, threading.Lock]] = [
+    (LRUConversationStore(capacity=MAX_SESSIONS // STORE_SHARDS), threading.Lock())
+    for _ in range(STORE_SHARDS)
+]
+
+
+def _shard(key: Tuple[str, str]) -> Tuple[LRUConversationStore, threading.Lock]:
+    return _SHARDS[hash(key) & (STORE_SHARDS - 1)]
 
 # Default system prompt used if no client-specific prompt is set.
 DEFAULT_SYSTEM_PROMPT = (
@@ -113,44 +342,178 @@ DEFAULT_SYSTEM_PROMPT = (
 )
 
 
+@functools.lru_cache(maxsize=256)
+def _normalize_client_id(client_id: str) -> str:
+    return client_id.upper()
+
+
+@functools.lru_cache(maxsize=256)
 def get_system_prompt(client_id: str) -> str:
     """Return the system prompt for a given client.
 
     If an environment variable named SYSTEM_PROMPT_<CLIENT_ID> exists, it
     will be used.  Otherwise the DEFAULT_SYSTEM_PROMPT is returned.
 
-    The client identifier is normalised to uppercase for lookup.
+    The client identifier is normalised to uppercase for lookup.  Results
+    are cached because the environment is only read at process start;
+    call ``reload_system_prompts()`` after changing it at runtime.
     """
-    env_key = f"SYSTEM_PROMPT_{client_id.upper()}"
+    env_key = f"SYSTEM_PROMPT_{_normalize_client_id(client_id)}"
     override = os.getenv(env_key)
     return override or DEFAULT_SYSTEM_PROMPT
 
 
-def detect_lang(text: str) -> str:
-    """Detect whether the text is German or English using langdetect.
+@functools.lru_cache(maxsize=256)
+def get_system_message(client_id: str) -> dict:
+    """Return the ``{"role": "system", ...}`` message for a client.
 
-    Returns 'de' for German, 'en' for English.  Falls back to a heuristic
-    based on umlauts if detection fails.
+    The dict is built once per client and shared by every request, so
+    callers must not mutate it.
     """
-    try:
-        code = detect(text)
-        return "de" if code.startswith("de") else "en"
-    except Exception:
-        return "de" if any(ch in text for ch in "äöüß") else "en"
+    return {"role": "system", "content": get_system_prompt(client_id)}
 
 
-def reset_if_inactive(client_id: str, channel_id: str) -> None:
-    """Clear the conversation history if inactive for too long."""
-    st = conversation_store[(client_id, channel_id)]
-    if datetime.now(timezone.utc) - st["last_activity"] > timedelta(minutes=INACTIVITY_MINUTES):
-        st["messages"].clear()
+def reload_system_prompts() -> None:
+    """Drop all cached prompts so SYSTEM_PROMPT_* changes take effect."""
+    _normalize_client_id.cache_clear()
+    get_system_prompt.cache_clear()
+    get_system_message.cache_clear()
+
+
+# Only German and English are ever distinguished, so the detector is built
+# from just those two language models, which keeps its memory footprint small.
+DETECTOR = (
+    LanguageDetectorBuilder.from_languages(Language.GERMAN, Language.ENGLISH)
+    .with_low_accuracy_mode()
+    .build()
+)
+
+# UTF-8 encodings of ä, ö, ü, ß (and the upper-case umlauts).  Any of these
+# is a strong enough signal for German that the detector can be skipped.
+UMLAUT_BYTES = (
+    b"\xc3\xa4", b"\xc3\xb6", b"\xc3\xbc", b"\xc3\x9f",
+    b"\xc3\x84", b"\xc3\x96", b"\xc3\x9c",
+)
+# Pure-ASCII messages shorter than this are treated as English outright.
+SHORT_ASCII_LEN = 40
+
+
+def detect_lang(text: str) -> str:
+    """Detect whether the text is German or English.
+
+    Returns 'de' for German, 'en' for English.  Clear cases are decided
+    with a quick byte scan: text containing umlauts is German, short
+    pure-ASCII text is English.  Everything else goes to lingua, falling
+    back to 'en' if the detector cannot decide.
+    """
+    if not text:
+        return "en"
+    data = text.encode("utf-8")
+    if any(marker in data for marker in UMLAUT_BYTES):
+        return "de"
+    if len(data) < SHORT_ASCII_LEN and data.isascii():
+        return "en"
+    language = DETECTOR.detect_language_of(text)
+    return "de" if language == Language.GERMAN else "en"
 
 
 def add_message(client_id: str, channel_id: str, role: str, content: str) -> None:
     """Append a message to the history and update last activity timestamp."""
-    st = conversation_store[(client_id, channel_id)]
-    st["messages"].append({"role": role, "content": content})
-    st["last_activity"] = datetime.now(timezone.utc)
+    key = (client_id, channel_id)
+    store, lock = _shard(key)
+    with lock:
+        st = store.get_or_create(key)
+        st["messages"].append((role, content))
+        st["last_activity"] = time.monotonic()
+
+
+def add_user_message(client_id: str, channel_id: str, content: str) -> List[Tuple[str, str]]:
+    """Record an incoming user message and return the resulting history.
+
+    The history is cleared first if the conversation has been inactive for
+    longer than INACTIVITY_SECONDS.  Everything happens in a single session
+    lookup under one lock acquisition.
+    """
+    key = (client_id, channel_id)
+    store, lock = _shard(key)
+    with lock:
+        st = store.get_or_create(key)
+        now = time.monotonic()
+        if now - st["last_activity"] > INACTIVITY_SECONDS:
+            st["messages"].clear()
+        st["messages"].append(("user", content))
+        st["last_activity"] = now
+        return list(st["messages"])
+
+
+def clear_history(client_id: str, channel_id: str) -> None:
+    """Forget the conversation history of a client and channel."""
+    key = (client_id, channel_id)
+    store, lock = _shard(key)
+    with lock:
+        st = store.get(key)
+        if st is not None:
+            st["messages"].clear()
+
+
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_TEMPERATURE = 0.4
+
+# Bounded pool for OpenAI round-trips that should not block the thread that
+# received the message (e.g. telebot's small handler pool).  At most
+# EXEC_MAX_PENDING jobs may be running or queued at once; callers going
+# through ``try_submit`` are turned away beyond that.
+EXEC = ThreadPoolExecutor(max_workers=64, thread_name_prefix="openai")
+EXEC_MAX_PENDING = 256
+_EXEC_SLOTS = threading.BoundedSemaphore(EXEC_MAX_PENDING)
+
+
+def try_submit(fn, *args) -> bool:
+    """Submit ``fn(*args)`` to EXEC unless the pending queue is full.
+
+    Returns False, without submitting, when EXEC_MAX_PENDING jobs are
+    already running or waiting.
+    """
+    if not _EXEC_SLOTS.acquire(blocking=False):
+        return False
+    try:
+        future = EXEC.submit(fn, *args)
+    except BaseException:
+        _EXEC_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _: _EXEC_SLOTS.release())
+    return True
+
+
+# Character budget for the history sent with each request (roughly 2k
+# tokens).  Older turns beyond it are left out of the prompt.
+MAX_HISTORY_CHARS = 8000
+
+
+def _trim_history(history: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Keep the newest messages that fit into MAX_HISTORY_CHARS.
+
+    The newest message is always kept, even if it alone exceeds the budget.
+    """
+    kept: List[Tuple[str, str]] = []
+    used = 0
+    for role, content in reversed(history):
+        used += len(content)
+        if kept and used > MAX_HISTORY_CHARS:
+            break
+        kept.append((role, content))
+    kept.reverse()
+    return kept
+
+
+def _prepare_messages(client_id: str, channel_id: str, user_text: str) -> List[dict]:
+    """Record the user's message and return the full prompt for the API."""
+    history = add_user_message(client_id, channel_id, user_text)
+    if sum(len(content) for _, content in history) > MAX_HISTORY_CHARS:
+        history = _trim_history(history)
+    messages = [get_system_message(client_id)]
+    messages += [{"role": role, "content": content} for role, content in history]
+    return messages
 
 
 def generate_reply_generic(client_id: str, channel_id: str, user_text: str) -> str:
@@ -158,22 +521,19 @@ def generate_reply_generic(client_id: str, channel_id: str, user_text: str) -> s
 
     This function encapsulates the logic for resetting inactive histories,
     assembling the prompt, and calling the OpenAI chat API.  It stores
-    both user and assistant messages in conversation_store to maintain
+    both user and assistant messages in the conversation store to maintain
     context over multiple turns.
     """
-    reset_if_inactive(client_id, channel_id)
-    add_message(client_id, channel_id, "user", user_text)
-
-    messages = [{"role": "system", "content": get_system_prompt(client_id)}]
-    messages.extend(conversation_store[(client_id, channel_id)]["messages"])
+    messages = _prepare_messages(client_id, channel_id, user_text)
 
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.4,
-        )
-        reply = (resp.choices[0].message.content or "").strip()
+        if len(messages) == 2:
+            # Only the system prompt and this message: the prompt does not
+            # depend on the user's history, so identical openers can share
+            # one API call.
+            reply = _coalesced_completion(client_id, user_text, messages)
+        else:
+            reply = _complete(messages)
     except Exception as e:
         reply = f"⚠️ Fehler bei der Antwortgenerierung: {e}"
 
@@ -181,6 +541,104 @@ def generate_reply_generic(client_id: str, channel_id: str, user_text: str) -> s
     return reply
 
 
+def _complete(messages: List[dict]) -> str:
+    resp = create_chat_completion(
+        model=CHAT_MODEL,
+        messages=messages,
+        temperature=CHAT_TEMPERATURE,
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+
+# Replies to history-free prompts, keyed by (client_id, system prompt,
+# user_text).  Identical requests arriving while one is in flight wait on the
+# same Future; finished replies are reused for RESULT_CACHE_TTL seconds.  Both
+# structures are only touched under INFLIGHT_LOCK.
+#
+# Replies are sampled at CHAT_TEMPERATURE, so this deliberately hands one
+# sampled reply to everyone sending the same opener: with no history in the
+# prompt, any sample is an equally valid answer, and none contains another
+# user's context.
+RESULT_CACHE_TTL = 60
+RESULT_CACHE: "cachetools.TTLCache[bytes, str]" = cachetools.TTLCache(
+    maxsize=2048, ttl=RESULT_CACHE_TTL
+)
+INFLIGHT: Dict[bytes, Future] = {}
+INFLIGHT_LOCK = threading.Lock()
+
+
+def _coalesced_completion(client_id: str, user_text: str, messages: List[dict]) -> str:
+    """Return a reply for a history-free prompt, sharing identical calls.
+
+    ``messages`` must be the system message followed by the user's message.
+    """
+    key = hashlib.blake2b(
+        b"|".join(
+            (
+                client_id.encode("utf-8"),
+                messages[0]["content"].encode("utf-8"),
+                user_text.encode("utf-8"),
+            )
+        ),
+        digest_size=16,
+    ).digest()
+    with INFLIGHT_LOCK:
+        reply = RESULT_CACHE.get(key)
+        if reply is not None:
+            return reply
+        future = INFLIGHT.get(key)
+        owner = future is None
+        if owner:
+            future = INFLIGHT[key] = Future()
+    if not owner:
+        return future.result()
+
+    try:
+        reply = _complete(messages)
+    except BaseException as e:
+        with INFLIGHT_LOCK:
+            INFLIGHT.pop(key, None)
+        future.set_exception(e)
+        raise
+    with INFLIGHT_LOCK:
+        RESULT_CACHE[key] = reply
+        INFLIGHT.pop(key, None)
+    future.set_result(reply)
+    return reply
+
+
+def stream_reply_generic(client_id: str, channel_id: str, user_text: str) -> Iterator[str]:
+    """Like ``generate_reply_generic`` but yield the reply in pieces.
+
+    Text deltas are yielded as they arrive from the API.  The complete
+    reply is stored in the history once the stream ends, even if the
+    consumer stops iterating early.
+    """
+    messages = _prepare_messages(client_id, channel_id, user_text)
+    parts: List[str] = []
+    stream = None
+    try:
+        stream = create_chat_completion(
+            model=CHAT_MODEL,
+            messages=messages,
+            temperature=CHAT_TEMPERATURE,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        error = f"⚠️ Fehler bei der Antwortgenerierung: {e}"
+        parts.append(("\n\n" if parts else "") + error)
+        yield parts[-1]
+    finally:
+        if stream is not None:
+            stream.response.close()
+        add_message(client_id, channel_id, "assistant", "".join(parts).strip())
+
+
 # ---------------------------------------------------------------------------
 # Telegram handlers
 #
@@ -188,7 +646,7 @@ def generate_reply_generic(client_id: str, channel_id: str, user_text: str) -> s
 def cmd_start(message):
     client_id = "default"
     channel_id = str(message.chat.id)
-    conversation_store[(client_id, channel_id)]["messages"].clear()
+    clear_history(client_id, channel_id)
     bot.reply_to(
         message,
         "👋 Willkommen bei KabutoAI!\n\n"
@@ -206,7 +664,7 @@ def cmd_start(message):
 def cmd_reset(message):
     client_id = "default"
     channel_id = str(message.chat.id)
-    conversation_store[(client_id, channel_id)]["messages"].clear()
+    clear_history(client_id, channel_id)
     bot.reply_to(message, "🧹 Kontext gelöscht. Neues Gespräch gestartet!")
 
 
@@ -218,19 +676,125 @@ def handle_text(message):
     if not user_text:
         bot.reply_to(message, "Sag mir kurz, wobei ich dir helfen soll. 🙂")
         return
-    reply = generate_reply_generic(client_id, channel_id, user_text)
-    bot.reply_to(message, reply)
+    if not try_submit(_stream_to_telegram, message, client_id, channel_id, user_text):
+        bot.reply_to(message, "⏳ Gerade ist viel los – bitte versuch es gleich noch einmal.")
+
+
+# Streamed replies are shown by editing one message in place.  Edits are
+# throttled to every TELEGRAM_EDIT_EVERY deltas and at most one per
+# TELEGRAM_EDIT_INTERVAL seconds to stay within Telegram's rate limits.
+TELEGRAM_EDIT_EVERY = 20
+TELEGRAM_EDIT_INTERVAL = 1.0
+
+
+# telebot falls back to the bot-wide HTML parse mode when parse_mode is None;
+# an empty string sends the text without any formatting.
+PLAIN_TEXT = ""
+
+
+def _stream_to_telegram(message, client_id: str, channel_id: str, user_text: str) -> None:
+    """Stream a reply into Telegram, editing the message as tokens arrive.
+
+    Partial text is sent without formatting, because a half-finished reply
+    is rarely valid HTML.  The final text is sent as HTML, falling back to
+    plain text if Telegram rejects it.
+    """
+    try:
+        bot.send_chat_action(message.chat.id, "typing")
+        sent = None
+        text = ""
+        pending = 0
+        last_edit = 0.0
+        for delta in stream_reply_generic(client_id, channel_id, user_text):
+            text += delta
+            pending += 1
+            if pending < TELEGRAM_EDIT_EVERY or time.monotonic() - last_edit < TELEGRAM_EDIT_INTERVAL:
+                continue
+            # Failed attempts are throttled like successful ones.
+            last_edit = time.monotonic()
+            try:
+                if sent is None:
+                    sent = bot.reply_to(message, text, parse_mode=PLAIN_TEXT)
+                else:
+                    bot.edit_message_text(
+                        text, sent.chat.id, sent.message_id, parse_mode=PLAIN_TEXT
+                    )
+            except telebot.apihelper.ApiTelegramException:
+                continue
+            pending = 0
+        _send_final_reply(message, sent, text.strip())
+    except Exception as e:
+        print(f"⚠️ Telegram-Antwort fehlgeschlagen: {e}")
+
+
+def _send_final_reply(message, sent, text: str) -> None:
+    """Send or edit in the complete reply as HTML, or as plain text if invalid."""
+    try:
+        if sent is None:
+            bot.reply_to(message, text)
+        else:
+            bot.edit_message_text(text, sent.chat.id, sent.message_id)
+        return
+    except telebot.apihelper.ApiTelegramException as e:
+        if "message is not modified" in str(e):
+            return
+    if sent is None:
+        bot.reply_to(message, text, parse_mode=PLAIN_TEXT)
+    else:
+        bot.edit_message_text(text, sent.chat.id, sent.message_id, parse_mode=PLAIN_TEXT)
 
 
 # ---------------------------------------------------------------------------
 # WhatsApp webhook (Twilio)
 #
+# Fixed TwiML replies for the error paths, rendered once instead of building
+# a MessagingResponse per request.
+_TWIML_EMPTY = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    "<Response><Message>Ich habe nichts empfangen.</Message></Response>"
+)
+_TWIML_NO_SENDER = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    "<Response><Message>Kein Absender angegeben.</Message></Response>"
+)
+
+
+def twilio_signature_valid() -> bool:
+    """Check the X-Twilio-Signature header of the current request.
+
+    Twilio signs the full webhook URL followed by every POST parameter
+    name and value, sorted by name, with HMAC-SHA1 keyed by the auth
+    token.  Behind Render's proxy the URL is rebuilt from PUBLIC_BASE_URL
+    so it matches the public https address Twilio called.
+    """
+    signature = request.headers.get("X-Twilio-Signature")
+    if not (_TWILIO_KEY and signature):
+        return False
+    if PUBLIC_BASE_URL:
+        url = PUBLIC_BASE_URL.rstrip("/") + request.full_path.rstrip("?")
+    else:
+        url = request.url
+    parts = [url]
+    for key in sorted(request.form):
+        for value in sorted(request.form.getlist(key)):
+            parts.append(key + value)
+    signed = "".join(parts).encode("utf-8")
+    mac = base64.b64encode(hmac.new(_TWILIO_KEY, signed, hashlib.sha1).digest())
+    return hmac.compare_digest(mac, signature.encode("utf-8"))
+
+
 @app.route("/whatsapp", methods=["POST"])
 def whatsapp_webhook() -> str:
     """Receive incoming WhatsApp messages via Twilio and respond (if available).
 
-    If the Twilio library is not installed, this endpoint returns an error.
+    Requests without a valid Twilio signature are rejected with 403 before
+    any work is done.  If the Twilio library is not installed, this
+    endpoint returns an error.
     """
+    if request_too_large():
+        abort(413)
+    if not twilio_signature_valid():
+        abort(403)
     # If Twilio is not available, return an informative error.  This avoids
     # crashing when the package is missing.
     if not TWILIO_AVAILABLE or MessagingResponse is None:
@@ -238,18 +802,16 @@ def whatsapp_webhook() -> str:
     # Twilio sends form-encoded data.  'From' contains the sender's number,
     # 'Body' contains the message text.  We ignore messages without a body.
     from_number = request.values.get("From")
-    body = request.values.get("Body", "").strip()
+    body = request.values.get("Body", "").strip()[:MAX_MESSAGE_CHARS]
     client_id = request.values.get("Client", "default")  # optional client identifier
-    resp = MessagingResponse()
     if not body:
-        resp.message("Ich habe nichts empfangen.")
-        return str(resp)
+        return _TWIML_EMPTY
     if not from_number:
-        resp.message("Kein Absender angegeben.")
-        return str(resp)
+        return _TWIML_NO_SENDER
     # Use the phone number as channel_id to maintain history per sender
     channel_id = from_number
     reply = generate_reply_generic(client_id, channel_id, body)
+    resp = MessagingResponse()
     resp.message(reply)
     return str(resp)
 
@@ -257,33 +819,31 @@ def whatsapp_webhook() -> str:
 # ---------------------------------------------------------------------------
 # Web chat widget
 #
-@app.route("/widget.js")
-def serve_widget_js():
-    """Serve the JavaScript for the embedded chat widget.
-
-    The widget displays a floating button and a chat window.  When the user
-    sends a message, it posts to ``/api/chat`` on the same host.  You can
-    customise colours and text by overriding the CSS and the header text
-    below.  To target a specific client, set the ``data-client-id`` attribute
-    on the script tag that loads this file and it will be passed through to
-    the API requests.
-    """
-    # The following JavaScript implements a dual-mode chat widget.  If the
-    # page contains an element with id="kabuto-chat-widget", the chat
-    # window is embedded inside that container and displayed by default.
-    # Otherwise, a floating button appears in the bottom right corner
-    # that toggles the chat window.  The script reads the API base URL
-    # from the ``data-api`` attribute of the script tag and an
-    # optional ``data-client-id`` to identify the tenant.
-    js_code = """
+# The following JavaScript implements a dual-mode chat widget.  If the
+# page contains an element with id="kabuto-chat-widget", the chat
+# window is embedded inside that container and displayed by default.
+# Otherwise, a floating button appears in the bottom right corner
+# that toggles the chat window.  The script reads the API base URL
+# from the ``data-api`` attribute of the script tag and an
+# optional ``data-client-id`` to identify the tenant.
+WIDGET_JS = """
     (() => {
       const scriptEl = document.currentScript || document.querySelector('script[src*="widget.js"]');
       const apiUrl = scriptEl && scriptEl.getAttribute('data-api') ? scriptEl.getAttribute('data-api') : '';
       const clientId = scriptEl && scriptEl.getAttribute('data-client-id') ? scriptEl.getAttribute('data-client-id') : 'default';
+      // Append one message; text is inserted as a text node, never as HTML
+      function appendMsg(msgsEl, className, label, text) {
+        const div = document.createElement('div');
+        if (className) div.className = className;
+        const b = document.createElement('strong');
+        b.textContent = label;
+        div.append(b, ' ', String(text));
+        msgsEl.appendChild(div);
+      }
       // Shared function to post a message and update UI with styled bubbles
       async function postAndRender(text, msgsEl, inputEl) {
         if (!text) return;
-        msgsEl.innerHTML += `<div class="kabuto-msg kabuto-user"><strong>Du:</strong> ${text}</div>`;
+        appendMsg(msgsEl, 'kabuto-msg kabuto-user', 'Du:', text);
         inputEl.value = '';
         try {
           const res = await fetch(apiUrl + '/api/chat', {
@@ -292,10 +852,10 @@ def serve_widget_js():
             body: JSON.stringify({ message: text, client_id: clientId })
           });
           const data = await res.json();
-          msgsEl.innerHTML += `<div class="kabuto-msg kabuto-bot"><strong>Kabuto:</strong> ${data.reply}</div>`;
+          appendMsg(msgsEl, 'kabuto-msg kabuto-bot', 'Kabuto:', data.reply);
           msgsEl.scrollTop = msgsEl.scrollHeight;
         } catch(err) {
-          msgsEl.innerHTML += `<div><b>Fehler:</b> ${err}</div>`;
+          appendMsg(msgsEl, '', 'Fehler:', err);
         }
       }
       // Attempt to mount inside existing placeholder
@@ -398,13 +958,60 @@ def serve_widget_js():
       sendBtn.onclick = () => postAndRender(input.value.trim(), msgs, input);
       input.addEventListener('keypress', e => { if (e.key === 'Enter') postAndRender(input.value.trim(), msgs, input); });
     })();
+"""
+
+# The script never changes at runtime, so it is encoded, gzipped and hashed
+# once at import time and served with long-lived cache headers.
+_WIDGET_JS = WIDGET_JS.encode("utf-8")
+_WIDGET_JS_GZ = gzip.compress(_WIDGET_JS, 9)
+_WIDGET_ETAG = hashlib.blake2b(_WIDGET_JS, digest_size=8).hexdigest()
+# The gzipped body is a different representation and needs its own tag.
+_WIDGET_ETAG_GZ = _WIDGET_ETAG + "-gz"
+
+
+@app.route("/widget.js")
+def serve_widget_js():
+    """Serve the JavaScript for the embedded chat widget.
+
+    The widget displays a floating button and a chat window.  When the user
+    sends a message, it posts to ``/api/chat`` on the same host.  You can
+    customise colours and text by overriding the CSS and the header text
+    in ``WIDGET_JS``.  To target a specific client, set the
+    ``data-client-id`` attribute on the script tag that loads this file and
+    it will be passed through to the API requests.
     """
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    etag = _WIDGET_ETAG_GZ if use_gzip else _WIDGET_ETAG
+    # Weak comparison, as RFC 9110 requires for If-None-Match; also matches "*".
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(_WIDGET_JS_GZ, mimetype="application/javascript")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(_WIDGET_JS, mimetype="application/javascript")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+    response.headers["Vary"] = "Accept-Encoding"
     # Permit cross-origin access to the widget script so it can be loaded
     # from static sites hosted on different domains (e.g. your static render app).
-    return js_code, 200, {
-        'Content-Type': 'application/javascript',
-        'Access-Control-Allow-Origin': '*'
-    }
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+# Pre-serialised reply for requests without a message.
+_EMPTY_REPLY_JSON = orjson.dumps({"reply": "Ich habe nichts empfangen."})
+
+
+def load_json_body():
+    """Parse the request body with orjson, returning None if it is invalid.
+
+    The raw body is not cached on the request, so it is read only once.
+    """
+    try:
+        return orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError:
+        return None
 
 
 @app.route("/api/chat", methods=["POST"])
@@ -416,17 +1023,34 @@ def chat_api():
     supplied, 'default' is used.  The channel_id for web chat is the
     combination of client_id and the remote IP address, which groups
     messages per user session.
+
+    Clients that send ``Accept: text/event-stream`` instead receive the
+    reply as Server-Sent Events: one ``data: {"delta": ...}`` frame per
+    text fragment, followed by an ``event: done`` frame.
     """
-    data = request.get_json(silent=True) or {}
-    user_msg = (data.get("message") or "").strip()
+    if request_too_large():
+        abort(413)
+    data = load_json_body() if request.is_json else {}
+    if not isinstance(data, dict):
+        data = {}
+    user_msg = (data.get("message") or "").strip()[:MAX_MESSAGE_CHARS]
     client_id = data.get("client_id", "default")
-    if not user_msg:
-        return jsonify({"reply": "Ich habe nichts empfangen."})
     # Use remote address to group messages from the same browser
     remote_ip = request.remote_addr or "anon"
     channel_id = f"web-{remote_ip}"
-    reply = generate_reply_generic(client_id, channel_id, user_msg)
-    response = jsonify({"reply": reply})
+    if not user_msg:
+        response = Response(_EMPTY_REPLY_JSON, mimetype="application/json")
+    elif "text/event-stream" in request.headers.get("Accept", ""):
+        def events():
+            for delta in stream_reply_generic(client_id, channel_id, user_msg):
+                yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+            yield b"event: done\ndata: {}\n\n"
+
+        response = Response(stream_with_context(events()), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+    else:
+        reply = generate_reply_generic(client_id, channel_id, user_msg)
+        response = jsonify({"reply": reply})
     # Add CORS header to allow cross-origin AJAX calls from static sites
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
@@ -476,21 +1100,22 @@ def send_whatsapp_message(to_number: str, body_text: str) -> None:
 WEBHOOK_PATH = f"/telegram/{TELEGRAM_API_TOKEN}"
 
 
-@app.get("/")
-def health() -> Tuple[str, int]:
-    return "KabutoAI webhook OK", 200
+@app.get("/healthz")
+def health():
+    """Cheap health probe for Render; ``/`` serves the landing page."""
+    return "ok", 200, {"Content-Type": "text/plain"}
 
 
 @app.post(WEBHOOK_PATH)
 def telegram_webhook():
-    if request.headers.get("content-type") != "application/json":
+    if not request.is_json:
         abort(403)
-    update_json = request.get_json(silent=True, force=True)
+    update_json = load_json_body()
     if not update_json:
         return "no json", 400
     update = telebot.types.Update.de_json(update_json)
     bot.process_new_updates([update])
-    return "ok", 200
+    return b"ok", 200
 
 
 def ensure_webhook() -> None:
@@ -510,8 +1135,9 @@ def ensure_webhook() -> None:
 
 
 if __name__ == "__main__":
-    # When running locally, you may need to call ensure_webhook() manually
-    # to register the Telegram webhook.  On Render, you can run this once
-    # on startup or via a separate management script.
+    # Register the Telegram webhook.  On Render this runs once before
+    # gunicorn starts (see render.yaml).  Pass --dev to also start Flask's
+    # single-threaded development server for local testing.
     ensure_webhook()
-    app.run(host="0.0.0.0", port=PORT)
\ No newline at end of file
+    if "--dev" in sys.argv:
+        app.run(host="0.0.0.0", port=PORT)